@@ -1,59 +1,16 @@
+from collections import namedtuple
+
+import numpy as np
 import streamlit as st
 import pandas as pd
-import datetime
-import urllib.parse
 
-# --- ユーティリティ: データ処理と防御的処理 ---
-def get_flexible_col(df, target_names, default=None):
-    """
-    dfの列名から target_names に含まれるか、あるいはそれに近い名前を探す。
-    ただし、「翻訳」という文字が含まれる列は、target自身に「翻訳」が入っていない限り避ける。
-    """
-    actual_cols = df.columns.tolist()
-    
-    # 1. 完全一致 (大文字小文字無視)
-    for target in target_names:
-        for col in actual_cols:
-            if target.lower() == col.lower():
-                return col
-                
-    # 2. 部分一致 (かつ「翻訳」を含まないものを優先)
-    for target in target_names:
-        for col in actual_cols:
-            if target in col and "翻訳" not in col:
-                return col
-                
-    # 3. それでも見つからない場合の最終手段 (「翻訳」を含んでいても良い)
-    for target in target_names:
-        for col in actual_cols:
-            if target in col:
-                return col
-    return default
-
-def ensure_col(df, target_names, fallback_val=""):
-    col = get_flexible_col(df, target_names)
-    if col is None:
-        virtual_name = target_names[0] + " (仮想)"
-        df[virtual_name] = fallback_val
-        return virtual_name
-    return col
-
-def make_youtube_url(base_url, start_time=0):
-    """
-    ライブのベースURLと曲の開始時間を結合して、正しい再生URLを構築する
-    """
-    if not base_url or base_url == "-" or str(base_url).lower() == "nan" or base_url == "#":
-        return "#"
-    
-    url = str(base_url).strip()
-    try:
-        # 秒数を整数化
-        s = int(float(str(start_time).replace("-", "0")))
-    except:
-        s = 0
-        
-    sep = "&" if "?" in url else "?"
-    return f"{url}{sep}t={s}s"
+from utils import (
+    PAGE_CSS,
+    ORDER_NUM_RE,
+    ensure_col,
+    make_youtube_urls,
+    load_data,
+)
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -64,100 +21,145 @@ st.set_page_config(
 )
 
 # --- Browser Translation Prevention & Custom CSS ---
-st.markdown("""
-<html class="notranslate" google="notranslate">
-<style>
-    /* ブラウザ翻訳を無効化するスタイル */
-    .main, .stApp, div, span, a {
-        unicode-bidi: isolate;
+st.markdown(PAGE_CSS, unsafe_allow_html=True)
+
+# --- データモデルの構築 ---
+# 列マッピング・派生列・ルックアップ辞書をひとまとめにしたモデル。
+# load_data の結果が変わらない限り一度しか計算されない。
+Model = namedtuple("Model", [
+    "df_songs", "df_lives",
+    "C_SONG", "C_TIME", "C_VOCAL", "C_ORDER", "C_LIVE_LINK",
+    "C_YT_ID", "C_START", "C_LAST", "C_LIVE_YT",
+    "L_DATE", "L_VENUE", "L_LIVE_NAME", "L_LIVE_TITLE", "L_STATUS", "L_YT_LINK",
+    "songs_by_live", "songs_by_order",
+])
+
+# cache_resource なので返り値は再実行ごとにデシリアライズ/コピーされない。
+# その代わり、モデル内のフレームは以降のページ側で絶対に変更しないこと。
+@st.cache_resource(show_spinner=False)
+def build_model(df_songs_raw, df_lives_raw):
+    # load_data (cache_data) は呼び出しごとに新しいコピーを返すので、
+    # ここで改めて防御コピーを取る必要はない
+    df_songs = df_songs_raw
+    df_lives = df_lives_raw
+
+    # 必須列のマッピングと欠損補完
+    # 1. 演奏曲目
+    C_SONG = ensure_col(df_songs, ["楽曲名", "曲名", "Song"])
+    C_TIME = ensure_col(df_songs, ["演奏時間", "演奏時間（平均）", "平均演奏時間", "Time"], fallback_val="0")
+    C_VOCAL = ensure_col(df_songs, ["ボーカル", "Vocal", "唄"])
+    C_ORDER = ensure_col(df_songs, ["演奏番号", "演奏順", "No", "順序", "Order", "演奏"], fallback_val="0")
+    C_LIVE_LINK = ensure_col(df_songs, ["ライブ番号", "ID", "ライブ名", "Live", "公演名"])
+    C_YT_ID = ensure_col(df_songs, ["YOUTUBE_ID", "Youtube", "VideoID", "動画ID", "YouTube"])
+    C_START = ensure_col(df_songs, ["STARTTIME", "開始時間", "Start"], fallback_val="0")
+    C_LAST = ensure_col(df_songs, ["ラスト", "前回", "Key"], fallback_val="-")
+
+    # 2. ライブ一覧
+    L_DATE = ensure_col(df_lives, ["日付", "Date", "開催日"])
+    L_VENUE = ensure_col(df_lives, ["会場名", "会場", "Venue", "場所"])
+    L_LIVE_NAME = ensure_col(df_lives, ["ライブ番号", "ID", "ライブ名", "Live", "名称"])
+    L_LIVE_TITLE = ensure_col(df_lives, ["ライブ名", "Live", "公演名", "名称"])
+    L_STATUS = ensure_col(df_lives, ["STATUS", "状態", "ステータス"], fallback_val="済")
+    L_YT_LINK = ensure_col(df_lives, ["動画リンク", "YouTubeリンク", "URL", "リンク"], fallback_val="")
+
+    # 楽曲データにライブごとの動画ベースURLを付与する
+    # 1列足すだけなので merge でフレーム全体を作り直さず、辞書 map で済ませる
+    yt_map = dict(zip(df_lives[L_LIVE_NAME].astype(str), df_lives[L_YT_LINK].astype(str)))
+    C_LIVE_YT = "_live_yt"
+    df_songs[C_LIVE_YT] = df_songs[C_LIVE_LINK].astype(str).map(yt_map).fillna("")
+
+    # 読み込み直後に一度だけソートしておく
+    # 再実行のたびに各ページで sort_values するのをやめ、ここで並び順を確定させる
+    df_songs['_order_num'] = (
+        pd.to_numeric(df_songs[C_ORDER].astype(str).str.extract(ORDER_NUM_RE, expand=False), errors='coerce')
+        .fillna(999).astype('int32')
+    )
+    df_songs = df_songs.sort_values([C_LIVE_LINK, '_order_num']).reset_index(drop=True)
+
+    # STARTTIME も読み込み時に一括で数値化しておく (描画ループ内の行ごとパースを排除)
+    df_songs[C_START] = (
+        pd.to_numeric(df_songs[C_START].astype(str).str.replace('-', '0', regex=False), errors='coerce')
+        .fillna(0).astype('int32')
+    )
+
+    # 再生URLも行単位ではなく、ここで全曲ぶん一括構築しておく
+    df_songs['_yt_url'] = make_youtube_urls(df_songs[C_LIVE_YT], df_songs[C_START])
+
+    # カード表示用の「LiveID-演奏番号」ラベル (例: 99-1) も前計算しておく
+    # ('99.0' のような小数表記は整数部へ、欠損演奏番号(999)は '-' に)
+    live_disp = df_songs[C_LIVE_LINK].astype(str).str.split('.').str[0]
+    order_disp = np.where(df_songs['_order_num'] == 999, '-', df_songs['_order_num'].astype(str))
+    df_songs['_disp_label'] = live_disp.str.cat(pd.Series(order_disp, index=df_songs.index), sep='-')
+    if "(仮想)" not in L_DATE:
+        df_lives = df_lives.sort_values(L_DATE).reset_index(drop=True)
+
+    # 検索用に日付+会場名を小文字化した列を一度だけ作っておく
+    # (キーストロークごとの astype(str) と大文字小文字変換を排除するため)
+    df_lives['_search_lc'] = (
+        df_lives[L_DATE].astype(str).str.cat(df_lives[L_VENUE].astype(str), sep=" ").str.lower()
+    )
+
+    # 低カーディナリティの文字列列は category 化しておく
+    # (groupby・等値フィルタが整数コードで走り、メモリも数分の一になる)
+    for c in {C_SONG, C_VOCAL, C_LIVE_LINK, C_LAST}:
+        if c in df_songs.columns:
+            df_songs[c] = df_songs[c].astype('category')
+    for c in {L_LIVE_NAME, L_VENUE, L_STATUS}:
+        if c in df_lives.columns:
+            df_lives[c] = df_lives[c].astype('category')
+
+    # 「未」を含むSTATUS (未定/未演奏など) の判定もここで一度だけリテラル走査して持っておく
+    df_lives['_upcoming'] = df_lives[L_STATUS].astype(str).str.contains('未', na=False, regex=False)
+
+    # ルックアップ辞書の構築
+    # メニュー2/3のクリックごとの全行スキャン (boolean mask) をO(1)の辞書参照に置き換える
+    songs_by_live = {str(k): v for k, v in df_songs.groupby(df_songs[C_LIVE_LINK].astype(str), sort=False)}
+    # 前回演奏ルックアップは1行しか使わないので、行を dict のリストに展開しておく
+    # (描画ループ内での boolean mask + head(1) を純粋な辞書参照にするため)
+    songs_by_order = {
+        str(k): v.to_dict('records')
+        for k, v in df_songs.groupby(df_songs[C_ORDER].astype(str), sort=False)
     }
-    .main { background-color: #0e1117; }
-    .stMetric { background-color: #1e2130; padding: 15px; border-radius: 10px; box-shadow: 0 4px 6px rgba(0,0,0,0.1); }
-    .song-card { background-color: #1e2130; padding: 20px; border-radius: 15px; margin-bottom: 15px; border-left: 5px solid #ff4b4b; }
-    .song-title { font-size: 1.2rem; font-weight: bold; color: #ffffff; }
-    .song-meta { font-size: 0.9rem; color: #a0a0a0; }
-    .youtube-link { color: #ff4b4b !important; text-decoration: underline !important; font-weight: bold; }
-    .youtube-link:hover { color: #ff8080 !important; }
-    h1, h2, h3 { color: #f0f2f6; }
-</style>
-</html>
-<script>
-    // ブラウザ翻訳を抑制するためのダミー属性付与
-    document.documentElement.className += ' notranslate';
-    document.documentElement.setAttribute('translate', 'no');
-</script>
-""", unsafe_allow_html=True)
-
-# --- Data Connection ---
-def load_data():
-    try:
-        raw_url = st.secrets["connections"]["gsheets"]["spreadsheet"]
-        if "/d/" in raw_url:
-            spreadsheet_id = raw_url.split("/d/")[1].split("/")[0]
-        else:
-            spreadsheet_id = raw_url
-        
-        base_csv_url = f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}/gviz/tq?tqx=out:csv&sheet="
-        
-        def get_sheet(sheet_name):
-            encoded_name = urllib.parse.quote(sheet_name)
-            url = base_csv_url + encoded_name
-            return pd.read_csv(url, encoding='utf-8')
 
-        df_songs = get_sheet("演奏曲目")
-        df_lives = get_sheet("ライブ一覧")
-        
-        # 列名のクリーニング
-        df_songs.columns = [c.strip() for c in df_songs.columns]
-        df_lives.columns = [c.strip() for c in df_lives.columns]
-        
-        # 全データに対して強制的に文字列変換
-        for df in [df_songs, df_lives]:
-            for col in df.columns:
-                if df[col].dtype == 'object':
-                    df[col] = df[col].astype(str).replace(['nan', 'None'], "-").fillna("-")
-        
-        return df_songs, df_lives
-    except Exception as e:
-        st.error(f"データの読み込み中にエラーが発生しました: {e}")
-        st.stop()
+    return Model(
+        df_songs, df_lives,
+        C_SONG, C_TIME, C_VOCAL, C_ORDER, C_LIVE_LINK,
+        C_YT_ID, C_START, C_LAST, C_LIVE_YT,
+        L_DATE, L_VENUE, L_LIVE_NAME, L_LIVE_TITLE, L_STATUS, L_YT_LINK,
+        songs_by_live, songs_by_order,
+    )
 
 # --- データ読み込みとマッピング ---
 df_songs_raw, df_lives_raw = load_data()
+model = build_model(df_songs_raw, df_lives_raw)
 
-# コピーを作成して破壊的変更を防ぐ
-df_songs = df_songs_raw.copy()
-df_lives = df_lives_raw.copy()
-
-# 必須列のマッピングと欠損補完
-# 1. 演奏曲目
-C_SONG = ensure_col(df_songs, ["楽曲名", "曲名", "Song"])
-C_TIME = ensure_col(df_songs, ["演奏時間", "演奏時間（平均）", "平均演奏時間", "Time"], fallback_val="0")
-C_VOCAL = ensure_col(df_songs, ["ボーカル", "Vocal", "唄"])
-C_ORDER = ensure_col(df_songs, ["演奏番号", "演奏順", "No", "順序", "Order", "演奏"], fallback_val="0")
-C_LIVE_LINK = ensure_col(df_songs, ["ライブ番号", "ID", "ライブ名", "Live", "公演名"])
-C_YT_ID = ensure_col(df_songs, ["YOUTUBE_ID", "Youtube", "VideoID", "動画ID", "YouTube"])
-C_START = ensure_col(df_songs, ["STARTTIME", "開始時間", "Start"], fallback_val="0")
-C_LAST = ensure_col(df_songs, ["ラスト", "前回", "Key"], fallback_val="-")
-
-# 2. ライブ一覧
-L_DATE = ensure_col(df_lives, ["日付", "Date", "開催日"])
-L_VENUE = ensure_col(df_lives, ["会場名", "会場", "Venue", "場所"])
-L_LIVE_NAME = ensure_col(df_lives, ["ライブ番号", "ID", "ライブ名", "Live", "名称"])
-L_LIVE_TITLE = ensure_col(df_lives, ["ライブ名", "Live", "公演名", "名称"])
-L_STATUS = ensure_col(df_lives, ["STATUS", "状態", "ステータス"], fallback_val="済")
-L_YT_LINK = ensure_col(df_lives, ["動画リンク", "YouTubeリンク", "URL", "リンク"], fallback_val="")
-
-# 楽曲データにライブごとの動画ベースURLを結合する
-# これにより、各曲の行でライブのベース動画URLが参照可能になる
-df_songs = df_songs.merge(
-    df_lives[[L_LIVE_NAME, L_YT_LINK]], 
-    left_on=C_LIVE_LINK, 
-    right_on=L_LIVE_NAME, 
-    how='left', 
-    suffixes=('', '_live')
-)
-C_LIVE_YT = L_YT_LINK + "_live" if L_YT_LINK in df_songs.columns else L_YT_LINK
+# ページ側のコードは従来どおりの名前で参照する
+df_songs, df_lives = model.df_songs, model.df_lives
+C_SONG, C_TIME, C_VOCAL, C_ORDER = model.C_SONG, model.C_TIME, model.C_VOCAL, model.C_ORDER
+C_LIVE_LINK, C_YT_ID, C_START, C_LAST = model.C_LIVE_LINK, model.C_YT_ID, model.C_START, model.C_LAST
+C_LIVE_YT = model.C_LIVE_YT
+L_DATE, L_VENUE, L_LIVE_NAME = model.L_DATE, model.L_VENUE, model.L_LIVE_NAME
+L_LIVE_TITLE, L_STATUS, L_YT_LINK = model.L_LIVE_TITLE, model.L_STATUS, model.L_YT_LINK
+SONGS_BY_LIVE, SONGS_BY_ORDER = model.songs_by_live, model.songs_by_order
+EMPTY_SONGS = df_songs.iloc[0:0]
+
+@st.cache_data(show_spinner=False)
+def compute_song_stats(df, song_col, time_col, vocal_col):
+    """
+    楽曲ごとの演奏回数ランキングを集計する。
+    入力が変わらない限りキャッシュされるので、サイドバーの切り替えだけでは再計算されない。
+    """
+    # song_col は category なので observed=True で観測済みカテゴリだけを集計する
+    stats = df.groupby(song_col, observed=True).agg(
+        **{
+            time_col: (time_col, "first"),
+            vocal_col: (vocal_col, "first"),
+            "演奏合計回数": (song_col, "size"),
+        }
+    ).reset_index()
+    # Arrow シリアライズのペイロードを減らすため、回数はint64ではなくint32で持つ
+    stats['演奏合計回数'] = stats['演奏合計回数'].astype('int32')
+    return stats.sort_values('演奏合計回数', ascending=False)
 
 # 画面トップでのデバッグ表示 (デフォルトは閉じておく)
 with st.expander("🛠️ スプレッドシート列名デバッグ"):
@@ -182,19 +184,16 @@ st.sidebar.title("VSOP Live Dashboard")
 menu = st.sidebar.radio("メニュー", ["🏠 楽曲一覧・分析", "📅 ライブ明細検索", "🚀 次回演奏予定"])
 
 # --- 1. 楽曲一覧・分析 ---
-if menu == "🏠 楽曲一覧・分析":
+# 各ページは st.fragment にして、ページ内のウィジェット操作では
+# そのフラグメントだけが再実行されるようにする (モジュール全体の再実行を回避)
+@st.fragment
+def render_ranking():
     st.title("🎵 楽曲ランキング & 分析")
-    
+
     # 楽曲ごとの集計
     try:
         # ランキングでは「演奏時間（平均）」に近いものを使うが、見つからない場合は0として扱う
-        song_stats = df_songs.groupby(C_SONG).agg({
-            C_TIME: 'first',
-            C_VOCAL: 'first',
-            C_SONG: 'count'
-        }).rename(columns={C_SONG: '演奏合計回数'}).reset_index()
-        
-        song_stats = song_stats.sort_values('演奏合計回数', ascending=False)
+        song_stats = compute_song_stats(df_songs, C_SONG, C_TIME, C_VOCAL)
         
         col1, col2, col3 = st.columns(3)
         col1.metric("総楽曲数", len(song_stats))
@@ -217,27 +216,36 @@ if menu == "🏠 楽曲一覧・分析":
         st.error(f"分析表示エラー: {e}")
 
 # --- 2. ライブ明細検索 ---
-elif menu == "📅 ライブ明細検索":
+@st.fragment
+def render_live_search():
     st.title("📅 過去のライブを探す")
-    
+
     search_query = st.text_input("会場名や年月で検索 (部分一致)")
-    
-    filtered_lives = df_lives.copy()
+
+    # boolean indexing は新しいフレームを返すので、検索前の全行 copy は不要
     if search_query:
-        mask = (
-            filtered_lives[L_VENUE].astype(str).str.contains(search_query, case=False, na=False) |
-            filtered_lives[L_DATE].astype(str).str.contains(search_query, case=False, na=False)
-        )
-        filtered_lives = filtered_lives[mask]
-    
+        # 部分一致はリテラル検索で十分なので正規表現エンジンを通さない
+        # 事前計算済みの小文字列に対する 1 パスの contains で済ませる
+        mask = df_lives['_search_lc'].str.contains(search_query.lower(), na=False, regex=False)
+        filtered_lives = df_lives[mask]
+    else:
+        filtered_lives = df_lives
+
     if filtered_lives.empty:
         st.warning("条件に一致するライブが見つかりません。")
     else:
-        filtered_lives['label'] = filtered_lives[L_DATE].astype(str) + " @ " + filtered_lives[L_VENUE].astype(str)
-        live_options = filtered_lives['label'].tolist()
+        # ラベルは列を追加せず独立した Series として構築する (apply(axis=1) は行ごとのPythonループになるため禁止)
+        labels = filtered_lives[L_DATE].astype(str).str.cat(
+            filtered_lives[L_VENUE].astype(str), sep=" @ "
+        )
+        live_options = labels.tolist()
+        # ラベル→行位置の辞書で O(1) で選択行を引く (同一ラベルが並んだ場合は先勝ち)
+        label_pos = {}
+        for i, lbl in enumerate(live_options):
+            label_pos.setdefault(lbl, i)
         selected_live_str = st.selectbox("ライブを選択してください", live_options)
-        
-        selected_live = filtered_lives[filtered_lives['label'] == selected_live_str].iloc[0]
+
+        selected_live = filtered_lives.iloc[label_pos[selected_live_str]]
         
         st.divider()
         st.header(f"🎸 {selected_live[L_VENUE]}")
@@ -248,47 +256,43 @@ elif menu == "📅 ライブ明細検索":
         """, unsafe_allow_html=True)
         
         # セットリスト抽出 (ライブ番号/IDで紐付け)
-        live_songs = df_songs[df_songs[C_LIVE_LINK].astype(str) == str(selected_live[L_LIVE_NAME])].copy()
-        
-        # 演奏番号でソート (文字列から数値へ変換を試みる)
-        if "(仮想)" not in C_ORDER:
-            # 一旦文字列にしてから、数値以外の文字を除去、その後数値変換
-            live_songs[C_ORDER] = live_songs[C_ORDER].astype(str).str.extract('(\d+)').fillna(999).astype(int)
-            live_songs = live_songs.sort_values(C_ORDER)
-        
+        # df_songs は読み込み時に演奏番号順でソート済みなので、ここでの並べ替えは不要。
+        # 共有キャッシュ上のスライスを読むだけなので copy も取らない (変更は厳禁)
+        live_songs = SONGS_BY_LIVE.get(str(selected_live[L_LIVE_NAME]), EMPTY_SONGS)
+
         if live_songs.empty:
             st.write("セットリスト情報がありません。")
         else:
-            for _, row in live_songs.iterrows():
-                # ライブ一覧から取得したベースURL + 演奏曲目のSTARTTIMEでURL生成
-                yt_link = make_youtube_url(row[C_LIVE_YT], row[C_START])
-                
-                with st.container():
-                    # 表示形式: LiveID-Order (例: 99-1)
-                    live_id_str = str(row[C_LIVE_LINK]).split('.')[0] if '.' in str(row[C_LIVE_LINK]) else str(row[C_LIVE_LINK])
-                    order_str = str(int(row["_order_num"])) if "_order_num" in row else "-"
-                    display_label = f"{live_id_str}-{order_str}"
-                        
-                    link_html = f'<a href="{yt_link}" target="_blank" class="youtube-link notranslate" translate="no" style="font-size: 1.3rem;">▶️ {row[C_SONG]}</a>' if yt_link != "#" else f'<span class="notranslate" translate="no" style="font-size: 1.3rem;">{row[C_SONG]}</span>'
-                    st.markdown(f"""
-                    <div class="song-card notranslate" translate="no">
-                        <div class="song-title" translate="no">
-                            <span class="notranslate" translate="no" style="color:#ff4b4b">{display_label}.</span> {link_html}
-                        </div>
-                        <div class="song-meta notranslate" translate="no">
-                            Vocal: {row[C_VOCAL]} | 演奏時間: {row[C_TIME]}
-                        </div>
+            # 行ごとに st.markdown を呼ぶと曲数ぶんのメッセージがフロントに飛ぶため、
+            # カードHTMLを連結して 1 回の markdown でまとめて描画する
+            html_parts = []
+            # Series を直接イテレートせず、NumPy 配列に出してから zip する (行ごとのボクシング回避)
+            for display_label, song, vocal, time_val, yt_link in zip(
+                live_songs['_disp_label'].to_numpy(), live_songs[C_SONG].to_numpy(),
+                live_songs[C_VOCAL].to_numpy(), live_songs[C_TIME].to_numpy(),
+                live_songs['_yt_url'].to_numpy()
+            ):
+                link_html = f'<a href="{yt_link}" target="_blank" class="youtube-link notranslate" translate="no" style="font-size: 1.3rem;">▶️ {song}</a>' if yt_link != "#" else f'<span class="notranslate" translate="no" style="font-size: 1.3rem;">{song}</span>'
+                html_parts.append(f"""
+                <div class="song-card notranslate" translate="no">
+                    <div class="song-title" translate="no">
+                        <span class="notranslate" translate="no" style="color:#ff4b4b">{display_label}.</span> {link_html}
+                    </div>
+                    <div class="song-meta notranslate" translate="no">
+                        Vocal: {vocal} | 演奏時間: {time_val}
                     </div>
-                    """, unsafe_allow_html=True)
+                </div>
+                """)
+            st.markdown("\n".join(html_parts), unsafe_allow_html=True)
 
 # --- 3. 次回演奏予定 ---
-elif menu == "🚀 次回演奏予定":
+@st.fragment
+def render_next_live():
     st.title("🚀 Next Performance Info")
-    
-    upcoming_lives = df_lives[df_lives[L_STATUS].astype(str).str.contains('未', na=False)]
-    if "(仮想)" not in L_DATE:
-        upcoming_lives = upcoming_lives.sort_values(L_DATE)
-    
+
+    # df_lives は日付順にソート済みで、未実施フラグも計算済み
+    upcoming_lives = df_lives[df_lives['_upcoming']]
+
     if upcoming_lives.empty:
         st.success("現在、予定されているライブはありません。")
     else:
@@ -302,60 +306,73 @@ elif menu == "🚀 次回演奏予定":
         selected_live_info = upcoming_lives[upcoming_lives[L_LIVE_TITLE] == selected_title].iloc[0]
         selected_id = selected_live_info[L_LIVE_NAME]
         
-        # セットリスト抽出
-        next_setlist = df_songs[df_songs[C_LIVE_LINK].astype(str) == str(selected_id)].copy()
-        if "(仮想)" not in C_ORDER:
-            # 文字列から数値を抽出してソート
-            next_setlist[C_ORDER] = next_setlist[C_ORDER].astype(str).str.extract('(\d+)').fillna(999).astype(int)
-            next_setlist = next_setlist.sort_values(C_ORDER)
-        
+        # セットリスト抽出 (ソート済みの df_songs 由来なので演奏番号順のまま)
+        # こちらも読み取り専用なので copy しない
+        next_setlist = SONGS_BY_LIVE.get(str(selected_id), EMPTY_SONGS)
+
         st.markdown(f'<h2 class="notranslate" translate="no">📝 Setlist: {selected_title}</h2>', unsafe_allow_html=True)
         
         if next_setlist.empty:
             st.write("このライブのセットリストはまだ登録されていません。")
         else:
-            for _, song in next_setlist.iterrows():
-                col1, col2 = st.columns([1, 1])
-                with col1:
-                    live_id_str = str(song[C_LIVE_LINK]).split('.')[0] if '.' in str(song[C_LIVE_LINK]) else str(song[C_LIVE_LINK])
-                    order_str = str(int(song["_order_num"])) if "_order_num" in song else "-"
-                    display_label = f"{live_id_str}-{order_str}"
-                    
-                    yt_link = make_youtube_url(song[C_LIVE_YT], song[C_START])
-                    link_html = f'<a href="{yt_link}" target="_blank" class="youtube-link notranslate" translate="no" style="font-size: 1.2rem;">▶️ {song[C_SONG]}</a>' if yt_link != "#" else f'<span class="notranslate" translate="no" style="font-size: 1.2rem;">{song[C_SONG]}</span>'
-                        
-                    st.markdown(f"""
-                    <div class="song-card notranslate" translate="no">
-                        <div class="song-title" translate="no">
-                            <span class="notranslate" translate="no" style="color:#ff4b4b">{display_label}.</span> {link_html}
-                        </div>
+            # st.columns を曲ごとに作り直すと曲数ぶんのデルタが発生するため、
+            # 左右それぞれのHTMLを連結し、1 組のカラムに 1 回ずつ markdown で流し込む
+            left_parts = []
+            right_parts = []
+            for display_label, song_name, yt_link, last_raw in zip(
+                next_setlist['_disp_label'].to_numpy(), next_setlist[C_SONG].to_numpy(),
+                next_setlist['_yt_url'].to_numpy(), next_setlist[C_LAST].to_numpy()
+            ):
+                link_html = f'<a href="{yt_link}" target="_blank" class="youtube-link notranslate" translate="no" style="font-size: 1.2rem;">▶️ {song_name}</a>' if yt_link != "#" else f'<span class="notranslate" translate="no" style="font-size: 1.2rem;">{song_name}</span>'
+                left_parts.append(f"""
+                <div class="song-card notranslate" translate="no">
+                    <div class="song-title" translate="no">
+                        <span class="notranslate" translate="no" style="color:#ff4b4b">{display_label}.</span> {link_html}
                     </div>
-                    """, unsafe_allow_html=True)
-                
-                with col2:
-                    # 予習用（前回）: 今の曲の「ラスト」の値を、全体の「演奏番号」から探す
-                    last_val = str(song[C_LAST])
-                    if last_val and last_val not in ["nan", "-", "0", ""]:
-                        # 検索！ 楽曲シートの「演奏番号」列が、今の曲の「ラスト」と一致するものを探す
-                        # (自分自身の今回のライブ ID は除外)
-                        past_perf = df_songs[
-                            (df_songs[C_ORDER].astype(str) == last_val) & 
-                            (df_songs[C_LIVE_LINK].astype(str) != str(selected_id))
-                        ].head(1)
-                        
-                        if not past_perf.empty:
-                            p_row = past_perf.iloc[0]
-                            # 前回演奏のYouTubeリンクも、そのライブIDに紐づく動画リンク + 引っ張ってきたSTARTTIMEで生成
-                            p_url = make_youtube_url(p_row[C_LIVE_YT], p_row[C_START])
-                            st.markdown(f"**📚 前回演奏時**")
-                            if p_url != "#":
-                                st.markdown(f'<div class="notranslate" translate="no"><a href="{p_url}" target="_blank" class="youtube-link">[{p_row[C_LIVE_LINK]} の映像]</a></div>', unsafe_allow_html=True)
-                            else:
-                                st.write(f"{p_row[C_LIVE_LINK]} (映像なし)")
+                </div>
+                """)
+
+                # 予習用（前回）: 今の曲の「ラスト」の値を、全体の「演奏番号」から探す
+                last_val = str(last_raw)
+                if last_val and last_val not in ["nan", "-", "0", ""]:
+                    # 検索！ 楽曲シートの「演奏番号」列が、今の曲の「ラスト」と一致するものを探す
+                    # (自分自身の今回のライブ ID は除外)
+                    candidates = SONGS_BY_ORDER.get(last_val, ())
+                    p_row = next(
+                        (r for r in candidates if str(r[C_LIVE_LINK]) != str(selected_id)),
+                        None
+                    )
+
+                    if p_row is not None:
+                        # 前回演奏のYouTubeリンクも読み込み時に一括構築済み
+                        p_url = p_row['_yt_url']
+                        if p_url != "#":
+                            body = f'<a href="{p_url}" target="_blank" class="youtube-link">[{p_row[C_LIVE_LINK]} の映像]</a>'
                         else:
-                            st.write("前回演奏データなし")
+                            body = f'{p_row[C_LIVE_LINK]} (映像なし)'
+                        right_parts.append(f'<div class="song-card notranslate" translate="no"><b>📚 前回演奏時</b><br>{body}</div>')
                     else:
-                        st.write("-")
+                        right_parts.append('<div class="song-card notranslate" translate="no">前回演奏データなし</div>')
+                else:
+                    right_parts.append('<div class="song-card notranslate" translate="no">-</div>')
+
+            col1, col2 = st.columns([1, 1])
+            with col1:
+                st.markdown("\n".join(left_parts), unsafe_allow_html=True)
+            with col2:
+                st.markdown("\n".join(right_parts), unsafe_allow_html=True)
+
+# --- メニューディスパッチ ---
+if menu == "🏠 楽曲一覧・分析":
+    render_ranking()
+elif menu == "📅 ライブ明細検索":
+    render_live_search()
+elif menu == "🚀 次回演奏予定":
+    render_next_live()
 
 st.sidebar.divider()
+if st.sidebar.button("🔄 データ再読み込み"):
+    # キャッシュを破棄して次回実行時にスプレッドシートを再取得する
+    st.cache_data.clear()
+    st.rerun()
 st.sidebar.caption("© 2026 VSOP Live Support System")
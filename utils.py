@@ -0,0 +1,187 @@
+import io
+import re
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import requests
+import streamlit as st
+
+# --- Browser Translation Prevention & Custom CSS ---
+# モジュール定数にしておくことで、文字列はプロセス内で一度だけ確保される。
+# Streamlit は再実行で描画されなかった要素を消すため、markdown 自体は毎回呼ぶ必要がある。
+PAGE_CSS = """
+<html class="notranslate" google="notranslate">
+<style>
+    /* ブラウザ翻訳を無効化するスタイル */
+    .main, .stApp, div, span, a {
+        unicode-bidi: isolate;
+    }
+    .main { background-color: #0e1117; }
+    .stMetric { background-color: #1e2130; padding: 15px; border-radius: 10px; box-shadow: 0 4px 6px rgba(0,0,0,0.1); }
+    .song-card { background-color: #1e2130; padding: 20px; border-radius: 15px; margin-bottom: 15px; border-left: 5px solid #ff4b4b; }
+    .song-title { font-size: 1.2rem; font-weight: bold; color: #ffffff; }
+    .song-meta { font-size: 0.9rem; color: #a0a0a0; }
+    .youtube-link { color: #ff4b4b !important; text-decoration: underline !important; font-weight: bold; }
+    .youtube-link:hover { color: #ff8080 !important; }
+    h1, h2, h3 { color: #f0f2f6; }
+</style>
+</html>
+<script>
+    // ブラウザ翻訳を抑制するためのダミー属性付与
+    document.documentElement.className += ' notranslate';
+    document.documentElement.setAttribute('translate', 'no');
+</script>
+"""
+
+# 演奏番号の数値部分を取り出すパターン (再実行ごとのre.compileを避けるため定数化)
+ORDER_NUM_RE = re.compile(r'(\d+)')
+
+# --- ユーティリティ: データ処理と防御的処理 ---
+def get_flexible_col(df, target_names, default=None):
+    """
+    dfの列名から target_names に含まれるか、あるいはそれに近い名前を探す。
+    ただし、「翻訳」という文字が含まれる列は、target自身に「翻訳」が入っていない限り避ける。
+    """
+    actual_cols = df.columns.tolist()
+    # 小文字化した列名の辞書を先に作り、完全一致は O(1) のルックアップで済ませる
+    lower_map = {c.lower(): c for c in actual_cols}
+
+    # 1. 完全一致 (大文字小文字無視)
+    for target in target_names:
+        col = lower_map.get(target.lower())
+        if col is not None:
+            return col
+
+    # 2. 部分一致 (かつ「翻訳」を含まないものを優先)
+    non_trans_cols = [c for c in actual_cols if "翻訳" not in c]
+    for target in target_names:
+        for col in non_trans_cols:
+            if target in col:
+                return col
+
+    # 3. それでも見つからない場合の最終手段 (「翻訳」を含んでいても良い)
+    for target in target_names:
+        for col in actual_cols:
+            if target in col:
+                return col
+    return default
+
+def ensure_col(df, target_names, fallback_val=""):
+    col = get_flexible_col(df, target_names)
+    if col is None:
+        virtual_name = target_names[0] + " (仮想)"
+        df[virtual_name] = fallback_val
+        return virtual_name
+    return col
+
+def clean_id(val):
+    """'99.0' のような小数表記のIDを '99' に整える"""
+    s = str(val)
+    return s.split('.')[0] if '.' in s else s
+
+def format_order(order_num):
+    """数値化済みの演奏番号を表示用文字列にする (欠損=999 は '-')"""
+    n = int(order_num)
+    return "-" if n == 999 else str(n)
+
+def make_youtube_url(base_url, start_time=0):
+    """
+    ライブのベースURLと曲の開始時間を結合して、正しい再生URLを構築する
+    """
+    if not base_url or base_url == "-" or str(base_url).lower() == "nan" or base_url == "#":
+        return "#"
+
+    url = str(base_url).strip()
+    # STARTTIME列は読み込み時に数値化済み。それ以外の呼び出しに備えて防御的に変換する
+    try:
+        s = int(start_time)
+    except (TypeError, ValueError):
+        s = 0
+
+    sep = "&" if "?" in url else "?"
+    return f"{url}{sep}t={s}s"
+
+def make_youtube_urls(bases, starts):
+    """
+    make_youtube_url のベクトル版。セットリスト全列の再生URLを一括で構築する。
+    行ごとの try/except・str/int 変換を避けられるので、読み込み時の一括前計算に使う。
+    """
+    base = bases.astype(str).str.strip()
+    s = pd.to_numeric(starts, errors='coerce').fillna(0).astype(int)
+    sep = np.where(base.str.contains('?', regex=False), '&', '?')
+    urls = base + sep + 't=' + s.astype(str) + 's'
+    invalid = base.isin(['', '-', '#']) | base.str.lower().eq('nan')
+    return urls.where(~invalid, '#')
+
+# --- Data Connection ---
+# docs.google.com へのTLS接続を2シート分のリクエストで使い回すための共有セッション。
+# レスポンス自体のキャッシュは st.cache_data 側が担当する。
+_SESSION = requests.Session()
+
+@st.cache_data(ttl=600, show_spinner=False)
+def get_sheet(spreadsheet_id, sheet_name):
+    """1シートぶんのCSVを取得する。シートごとに独立してキャッシュされる。"""
+    encoded_name = urllib.parse.quote(sheet_name)
+    url = (
+        f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}"
+        f"/gviz/tq?tqx=out:csv&sheet={encoded_name}"
+    )
+    resp = _SESSION.get(url, timeout=10)
+    resp.raise_for_status()
+    buf = io.StringIO(resp.text)
+    try:
+        # pyarrow のマルチスレッドCSVリーダーで読む (streamlit が pyarrow に依存しているため通常は利用可能)
+        return pd.read_csv(buf, engine='pyarrow')
+    except ImportError:
+        buf.seek(0)
+        return pd.read_csv(buf)
+
+@st.cache_data(ttl=600, show_spinner=False)
+def _load_sheets(spreadsheet_id):
+    # 2枚のシートは独立したHTTP GETなので並行で取得する (待ち時間が max(t1,t2) になる)
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        f_songs = ex.submit(get_sheet, spreadsheet_id, "演奏曲目")
+        f_lives = ex.submit(get_sheet, spreadsheet_id, "ライブ一覧")
+        df_songs = f_songs.result()
+        df_lives = f_lives.result()
+
+    # 列名のクリーニング
+    df_songs.columns = [c.strip() for c in df_songs.columns]
+    df_lives.columns = [c.strip() for c in df_lives.columns]
+
+    # 全データに対して強制的に文字列変換
+    # (列ごとのPythonループではなく、object列ブロックをまとめてベクトル演算する)
+    for df in [df_songs, df_lives]:
+        obj_cols = df.select_dtypes(include='object').columns
+        if len(obj_cols):
+            block = df[obj_cols].astype(str)
+            df[obj_cols] = block.mask(block.isin(['nan', 'None']), "-")
+
+    # object列は Arrow バックエンドの string 型に載せ替える
+    # (連続バッファ + ベクトル化strカーネルで contains / 等値比較が速くなる)
+    try:
+        for df in [df_songs, df_lives]:
+            str_cols = df.select_dtypes(include='object').columns
+            if len(str_cols):
+                df[str_cols] = df[str_cols].astype('string[pyarrow]')
+    except ImportError:
+        pass
+
+    return df_songs, df_lives
+
+def load_data():
+    # secrets の読み出しはキャッシュの外で行う。スプレッドシートIDが
+    # キャッシュキーになるので、設定変更がそのまま再取得につながる。
+    try:
+        raw_url = st.secrets["connections"]["gsheets"]["spreadsheet"]
+        if "/d/" in raw_url:
+            spreadsheet_id = raw_url.split("/d/")[1].split("/")[0]
+        else:
+            spreadsheet_id = raw_url
+
+        return _load_sheets(spreadsheet_id)
+    except Exception as e:
+        st.error(f"データの読み込み中にエラーが発生しました: {e}")
+        st.stop()